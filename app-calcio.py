@@ -1,12 +1,24 @@
 import streamlit as st
 import pandas as pd
 import gspread
-from google.oauth2.service_account import Credentials
 import json
 from datetime import date, datetime
 import hashlib
 import time
 import base64
+import threading
+from collections import deque
+
+import dati
+from dati import (
+    NOTE_COLUMNS, sample_data, safe_int_convert, stale_players_mask,
+    build_duplicate_index, find_duplicates, normalize_name
+)
+
+# Copy-on-Write: le viste derivate dallo snapshot condiviso non lo modificano mai
+# (sempre attivo da pandas 3.0, va abilitato esplicitamente nelle 2.x)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
 
 # Configurazione pagina
 st.set_page_config(
@@ -130,153 +142,636 @@ def keep_session_alive():
 
 # NUOVO: Nessuno stile pandas - useremo un approccio diverso più avanti
 
-# Funzione per inizializzare la connessione a Google Sheets
+# NUOVO: Connessione a Google Sheets condivisa, con controllo di salute e riconnessione.
+# Invece di memorizzare per sempre un None in caso di errore, la connessione viene
+# ricreata (al massimo ogni RECONNECT_INTERVAL secondi) e verificata periodicamente.
+HEALTH_CHECK_INTERVAL = 300
+RECONNECT_INTERVAL = 30
+
 @st.cache_resource
+def gsheet_connection():
+    return {"lock": threading.Lock(), "sheet": None, "error": None, "checked_at": 0.0}
+
+def connect_gsheet():
+    """Apre il foglio con le credenziali dei secrets; None se non configurate (modalità demo)"""
+    if "gsheet_credentials" not in st.secrets:
+        return None
+    return dati.connect_gsheet(
+        dict(st.secrets["gsheet_credentials"]),
+        st.secrets.get("sheet_id", dati.DEFAULT_SHEET_ID)
+    )
+
+# Funzione per inizializzare la connessione a Google Sheets
 def init_gsheet():
-    try:
-        # Configurazione delle credenziali Google Sheets
-        if "gsheet_credentials" in st.secrets:
-            credentials_info = dict(st.secrets["gsheet_credentials"])
-            
-            credentials = Credentials.from_service_account_info(
-                credentials_info,
-                scopes=[
-                    "https://www.googleapis.com/auth/spreadsheets",
-                    "https://www.googleapis.com/auth/drive"
-                ]
-            )
-            
-            gc = gspread.authorize(credentials)
-            sheet_id = st.secrets.get("sheet_id", "1GjubMgZkxjISauMyrnQdZlunOUMEKKSGoEwk6tm7d4c")
-            
+    """Restituisce il foglio principale, o None in modalità demo / se non raggiungibile"""
+    return check_connection(gsheet_connection(), connect_gsheet)
+
+def check_connection(conn, connect):
+    """Verifica o ricrea la connessione conn con connect(); non usa Streamlit, così può
+    essere chiamata anche dai thread in background"""
+    with conn["lock"]:
+        now = time.time()
+        
+        # Controllo di salute: una connessione scaduta viene ricreata subito
+        if conn["sheet"] is not None and now - conn["checked_at"] > HEALTH_CHECK_INTERVAL:
             try:
-                spreadsheet = gc.open_by_key(sheet_id)
-                sheet = spreadsheet.sheet1
-                sheet.get('A1:A1')
-                return sheet
-            except gspread.exceptions.SpreadsheetNotFound:
-                st.error("❌ Foglio Google Sheets non trovato. Verifica l'ID del foglio.")
-                st.error("💡 Assicurati che il service account abbia accesso al foglio.")
-                return None
-            except gspread.exceptions.APIError as api_error:
-                st.error(f"❌ Errore API Google Sheets: {str(api_error)}")
-                st.error("💡 Verifica che le API Google Sheets e Drive siano abilitate.")
-                return None
-                
-        else:
-            st.warning("⚠️ Credenziali Google Sheets non configurate. Modalità demo attiva.")
-            return None
-            
-    except Exception as e:
-        st.error(f"Errore connessione Google Sheets: {str(e)}")
+                conn["sheet"].get('A1:A1')
+                conn["checked_at"] = now
+            except Exception:
+                conn["sheet"] = None
+                conn["checked_at"] = 0.0
+        
+        if conn["sheet"] is None and now - conn["checked_at"] > RECONNECT_INTERVAL:
+            try:
+                conn["sheet"] = connect()
+                conn["error"] = None
+            except Exception as e:
+                conn["error"] = e
+            conn["checked_at"] = now
+        
+        return conn["sheet"]
+
+def show_connection_status():
+    """Mostra gli avvisi sullo stato della connessione (una volta per esecuzione)"""
+    error = gsheet_connection()["error"]
+    if isinstance(error, gspread.exceptions.SpreadsheetNotFound):
+        st.error("❌ Foglio Google Sheets non trovato. Verifica l'ID del foglio.")
+        st.error("💡 Assicurati che il service account abbia accesso al foglio.")
+    elif isinstance(error, gspread.exceptions.APIError):
+        st.error(f"❌ Errore API Google Sheets: {str(error)}")
+        st.error("💡 Verifica che le API Google Sheets e Drive siano abilitate.")
+    elif error is not None:
+        st.error(f"Errore connessione Google Sheets: {str(error)}")
         st.error("💡 Verifica che il service account abbia accesso al foglio e che le API siano abilitate.")
+    elif init_gsheet() is None and data_store()["source"] == "demo":
+        st.warning("⚠️ Credenziali Google Sheets non configurate. Modalità demo attiva.")
+    
+    if archive_state()["error"] is not None:
+        st.warning(f"⚠️ Archiviazione automatica non riuscita, verrà ritentata: {str(archive_state()['error'])}")
+    
+    if data_store()["source"] == "copia locale" and init_gsheet() is None:
+        st.warning(f"📦 Foglio non raggiungibile: dati in sola lettura dalla copia locale "
+                   f"del {data_store()['saved_at']}.")
+
+# NUOVO: Riscaldamento all'avvio del server: connessione e primo caricamento dei dati
+# avvengono in background (una sola volta per processo), mentre l'utente fa il login.
+# Il thread non ha un contesto Streamlit: usa solo dati.py, e gli errori finiscono
+# in gsheet_connection()["error"], mostrati da show_connection_status.
+@st.cache_resource
+def start_warmup():
+    conn = gsheet_connection()
+    store = data_store()
+    try:
+        credentials = dict(st.secrets["gsheet_credentials"])
+        sheet_id = st.secrets.get("sheet_id", dati.DEFAULT_SHEET_ID)
+    except Exception:
+        return None  # modalità demo: niente da preparare
+    
+    def warm_up():
+        sheet = check_connection(conn, lambda: dati.connect_gsheet(credentials, sheet_id))
+        if sheet is None:
+            return
+        try:
+            df = fetch_sheet_snapshot(sheet)
+        except Exception as e:
+            conn["error"] = e
+            return
+        with store["lock"]:
+            if df is not None and store["df"] is None:
+                publish_snapshot(store, df, "foglio")
+    
+    thread = threading.Thread(target=warm_up, name="gsheet-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def fetch_sheet_snapshot(sheet):
+    """Dati compatti scaricati senza Streamlit (per i thread in background);
+    None se il foglio non ha ancora le intestazioni"""
+    headers = dati.fetch_headers(sheet)
+    if not headers:
         return None
+    df = dati.fetch_data(sheet, headers)
+    save_local_copy(df, dati.SNAPSHOT_DATA, headers)
+    return df
+
+# Intestazioni del foglio (riga 1), usate per individuare le colonne
+@st.cache_data(ttl=60, show_spinner=False)
+def load_headers():
+    sheet = init_gsheet()
+    if sheet:
+        return dati.fetch_headers(sheet)
+    _, metadata = dati.read_snapshot(dati.SNAPSHOT_DATA)
+    if metadata:
+        return metadata["headers"]
+    return list(sample_data().columns)
+
+# NUOVO: Snapshot unico dei dati condiviso da tutte le sessioni.
+# A differenza di st.cache_data non viene copiato a ogni rerun: ogni sessione riceve
+# lo stesso DataFrame, da trattare in sola lettura (le modifiche producono nuovi
+# DataFrame grazie al Copy-on-Write). La versione cresce a ogni ricaricamento.
+# All'avvio (o dopo un salvataggio) lo snapshot viene servito subito dalla copia
+# locale su disco e riallineato al foglio in background.
+SNAPSHOT_TTL = 60
+
+@st.cache_resource
+def data_store():
+    return {
+        "lock": threading.Lock(), "df": None, "version": 0, "loaded_at": 0.0,
+        "source": None, "saved_at": None, "refreshing": False, "reloaded_version": 0,
+        "index_lock": threading.Lock(), "duplicate_index": None
+    }
+
+def publish_snapshot(store, df, source, saved_at=None, reload=True):
+    """Sostituisce lo snapshot condiviso (da chiamare con il lock acquisito).
+    reload=False solo per i salvataggi, descritti dalle variazioni pubblicate sul canale:
+    dopo un ricaricamento completo i risultati derivati vanno ricalcolati da zero."""
+    store["df"] = df
+    store["source"] = source
+    store["saved_at"] = saved_at
+    store["version"] += 1
+    store["loaded_at"] = time.time()
+    if reload:
+        store["reloaded_version"] = store["version"]
+
+def refresh_in_background(sheet):
+    """Riallinea lo snapshot al foglio senza bloccare chi sta leggendo la copia locale.
+    Come il riscaldamento, il thread usa solo dati.py e registra gli errori nella connessione."""
+    store = data_store()
+    conn = gsheet_connection()
+    if sheet is None or store["refreshing"]:
+        return
+    store["refreshing"] = True
+    
+    def refresh():
+        try:
+            df = fetch_sheet_snapshot(sheet)
+            with store["lock"]:
+                if df is None:
+                    store["df"] = None  # foglio vuoto: lo inizializza il prossimo caricamento
+                elif store["source"] == "copia locale":
+                    publish_snapshot(store, df, "foglio")
+        except Exception as e:
+            conn["error"] = e
+        finally:
+            store["refreshing"] = False
+    
+    threading.Thread(target=refresh, name="snapshot-refresh", daemon=True).start()
+
+def reload_snapshot():
+    """Sostituisce subito la copia locale con i dati del foglio; False se non raggiungibile"""
+    store = data_store()
+    with store["lock"]:
+        df, source, saved_at = fetch_data()
+        if source != "foglio":
+            return False
+        publish_snapshot(store, df, source, saved_at)
+        return True
 
-# FIX: Cache con gestione migliorata per evitare reset
-@st.cache_data(ttl=60, show_spinner="Caricamento dati...")
 def load_data(_session_id=None):
-    """Carica i dati con cache persistente basata su session_id"""
+    """Restituisce lo snapshot condiviso, ricaricandolo dal foglio se scaduto o invalidato"""
+    store = data_store()
+    # Il lock evita che più sessioni scarichino il foglio contemporaneamente
+    with store["lock"]:
+        if store["df"] is None:
+            local_df, metadata = dati.read_snapshot(dati.SNAPSHOT_DATA)
+            if local_df is not None:
+                publish_snapshot(store, local_df, "copia locale", metadata.get("salvato"))
+                refresh_in_background(init_gsheet())
+        
+        if store["df"] is None or time.time() - store["loaded_at"] > SNAPSHOT_TTL:
+            with st.spinner("Caricamento dati..."):
+                df, source, saved_at = fetch_data()
+                # NUOVO: L'archiviazione lavora solo su dati appena scaricati dal foglio
+                archived = archive_stale_players(df) if source == "foglio" else []
+                if archived:
+                    df = df.drop(index=[row for row, _ in archived]).reset_index(drop=True)
+                publish_snapshot(store, df, source, saved_at)
+                publish_deltas([make_delta("archiviazione", row, player, user=ARCHIVE_USER) for row, player in archived])
+        
+        # Le scritture di questa esecuzione partono da questi dati: save_data deve sapere
+        # se vengono dalla copia locale e quante righe avevano
+        st.session_state.data_source = store["source"]
+        st.session_state.data_rows = len(store["df"])
+        return store["df"]
+
+def snapshot_version():
+    return data_store()["version"]
+
+def replace_snapshot(df):
+    """Pubblica come snapshot condiviso i dati appena salvati sul foglio"""
+    store = data_store()
+    with store["lock"]:
+        publish_snapshot(store, df.drop(columns=NOTE_COLUMNS, errors="ignore"), "foglio", reload=False)
+
+def invalidate_snapshot():
+    with data_store()["lock"]:
+        data_store()["df"] = None
+
+def fetch_data():
+    """Scarica i dati strutturati (senza le colonne di note) dal foglio.
+    Restituisce (df, origine, data della copia locale)."""
     sheet = init_gsheet()
     if sheet:
         try:
-            data = sheet.get_all_records()
-            df = pd.DataFrame(data)
-            
-            # Aggiungi colonne se non esistono
-            new_columns = {
-                "Numero Visione Partite": 0,
-                "Livello 1": "",
-                "Livello 2": "",
-                "Livello 1 Prospettiva": "",
-                "Link Transfermarkt": "",
-                "Data inserimento in piattaforma": "",
-                "Data ultima visione": "",
-                "Data presentazione a Miniero": ""
-            }
-            
-            if len(df) > 0:
-                for col_name, default_value in new_columns.items():
-                    if col_name not in df.columns:
-                        df[col_name] = default_value
-            
-            if len(df) > 0:
-                rows_info = f"Righe utilizzate: {len(df)+1}/10,000,000 (Google Sheets supporta fino a 10 milioni di righe)"
-                if "rows_info" not in st.session_state:
-                    st.session_state.rows_info = rows_info
-            
-            return df
+            headers = load_headers()
+            if not headers:
+                # Foglio vuoto: servono le intestazioni prima di poter aggiungere il primo giocatore
+                dati.init_headers(sheet)
+                load_headers.clear()
+                headers = load_headers()
+            df = dati.fetch_data(sheet, headers)
+            save_local_copy(df, dati.SNAPSHOT_DATA, headers)
+            gsheet_connection()["error"] = None
+            return df, "foglio", None
         except Exception as e:
-            try:
-                headers = [
-                    "Nome Giocatore", "Squadra", "Età", "Ruolo", "Valore di Mercato",
-                    "Procuratore", "Altezza", "Piede", "Convocazioni", "Partite Giocate",
-                    "Gol", "Assist", "Minuti Giocati", "Data Inizio Contratto", 
-                    "Data Fine Contratto", "Numero Visione Partite", 
-                    "Data inserimento in piattaforma", "Data ultima visione", 
-                    "Data presentazione a Miniero",
-                    "Da Monitorare", "Note Danilo/Antonio", "Note Alessio/Fabrizio", 
-                    "Presentato a Miniero", "Risposta Miniero", "Livello 1", "Livello 2", 
-                    "Livello 1 Prospettiva", "Link Transfermarkt"
-                ]
-                sheet.insert_row(headers, 1)
-                return pd.DataFrame(columns=headers)
-            except Exception as header_error:
-                st.error(f"Errore nell'inizializzazione del foglio: {str(header_error)}")
-                return pd.DataFrame()
-    else:
-        # Modalità demo con dati di esempio
-        sample_data = {
-            "Nome Giocatore": ["Mario Rossi", "Luca Bianchi"],
-            "Squadra": ["Juventus", "Milan"],
-            "Età": [25, 28],
-            "Ruolo": ["Centrocampista", "Attaccante"],
-            "Valore di Mercato": ["15M€", "20M€"],
-            "Procuratore": ["Raiola", "Mendes"],
-            "Altezza": [180, 175],
-            "Piede": ["Destro", "Sinistro"],
-            "Convocazioni": [45, 52],
-            "Partite Giocate": [38, 41],
-            "Gol": [8, 15],
-            "Assist": [12, 7],
-            "Minuti Giocati": [3200, 3650],
-            "Data Inizio Contratto": ["2022-07-01", "2021-08-15"],
-            "Data Fine Contratto": ["2025-06-30", "2024-07-31"],
-            "Numero Visione Partite": [5, 8],
-            "Data inserimento in piattaforma": ["2024-01-15", "2024-02-20"],
-            "Data ultima visione": ["2024-03-10", "2024-03-25"],
-            "Data presentazione a Miniero": ["2024-02-01", ""],
-            "Da Monitorare": ["X", ""],
-            "Note Danilo/Antonio": ["Buon potenziale", "Ottimo in zona gol"],
-            "Note Alessio/Fabrizio": ["Da seguire", "Pronto per il salto"],
-            "Presentato a Miniero": ["X", ""],
-            "Risposta Miniero": ["Interessante", "Da valutare"],
-            "Livello 1": ["X", ""],
-            "Livello 2": ["", "X"],
-            "Livello 1 Prospettiva": ["", "X"],
-            "Link Transfermarkt": ["https://www.transfermarkt.it/mario-rossi/profil/spieler/123456", 
-                                   "https://www.transfermarkt.it/luca-bianchi/profil/spieler/789012"]
-        }
-        return pd.DataFrame(sample_data)
+            # Lettura fallita (quota, errore del server...): il foglio non è vuoto, quindi
+            # niente intestazioni da scrivere né snapshot "foglio" su cui salvare
+            gsheet_connection()["error"] = e
+    
+    # NUOVO: Foglio non raggiungibile o illeggibile: meglio l'ultima copia valida dei dati demo
+    local_df, metadata = dati.read_snapshot(dati.SNAPSHOT_DATA)
+    if local_df is not None:
+        return local_df, "copia locale", metadata.get("salvato")
+    
+    # Modalità demo con dati di esempio
+    return sample_data().drop(columns=NOTE_COLUMNS), "demo", None
+
+# NUOVO: Copia locale su disco dopo ogni caricamento o salvataggio riuscito
+def save_local_copy(df, name, headers):
+    try:
+        dati.write_snapshot(df, name, {"headers": list(headers)})
+    except Exception:
+        pass  # la copia locale è solo un'ottimizzazione: non deve bloccare l'app
+
+# NUOVO: Note di tutti i giocatori, scaricate solo quando servono
+@st.cache_data(ttl=60, show_spinner="Caricamento note...")
+def load_notes():
+    sheet = init_gsheet()
+    if sheet:
+        notes = dati.fetch_notes(sheet, load_headers())
+        save_local_copy(notes, dati.SNAPSHOT_NOTES, load_headers())
+        return notes
+    
+    local_notes, _ = dati.read_snapshot(dati.SNAPSHOT_NOTES)
+    if local_notes is not None:
+        return local_notes
+    return sample_data()[["Nome Giocatore"] + NOTE_COLUMNS]
+
+# NUOVO: Note di un singolo giocatore (usate dal form di modifica)
+@st.cache_data(ttl=60, show_spinner=False)
+def load_player_notes(row_index):
+    """Legge solo la riga del giocatore selezionato invece di tutte le note"""
+    sheet = init_gsheet()
+    if sheet:
+        return dati.fetch_player_notes(sheet, load_headers(), row_index)
+    return load_notes().iloc[row_index].to_dict()
+
+# NUOVO: Unisce le note al DataFrame compatto (per la visualizzazione o il salvataggio)
+def with_notes(df):
+    """Restituisce df con le colonne di note, nell'ordine delle colonne del foglio"""
+    if all(col_name in df.columns for col_name in NOTE_COLUMNS):
+        return df.copy(deep=False)
+    
+    try:
+        return dati.merge_notes(df, load_notes(), load_headers())
+    except dati.NotesMisalignedError:
+        stop_on_changed_data()
+
+def stop_on_changed_data():
+    """Il foglio è cambiato nel frattempo: meglio fermarsi che mostrare o salvare
+    note sul giocatore sbagliato"""
+    clear_data_cache()
+    st.error("⚠️ I dati sono stati modificati nel frattempo. Ricarica la pagina e riprova.")
+    st.stop()
+
+# Svuota tutte le cache dei dati dopo una modifica o su richiesta
+def clear_data_cache():
+    invalidate_snapshot()
+    load_headers.clear()
+    load_notes.clear()
+    load_player_notes.clear()
 
 # Funzione per salvare i dati
 def save_data(df):
+    # NUOVO: Dati presi dalla copia locale, forse vecchia di giorni: riscrivere il foglio
+    # cancellerebbe tutto ciò che è cambiato dopo (es. un import da cli.py)
+    if st.session_state.get("data_source") == "copia locale":
+        if init_gsheet() and reload_snapshot():
+            st.error("❌ I dati mostrati venivano dalla copia locale e non erano aggiornati: sono stati "
+                     "ricaricati dal foglio. La modifica non è stata salvata, ripetila sui dati aggiornati.")
+        else:
+            st.error("❌ Foglio non raggiungibile: le modifiche non sono state salvate. Riprova più tardi.")
+        return False
+    
     sheet = init_gsheet()
-    if sheet:
+    if sheet and st.session_state.get("data_source") == "foglio":
         try:
-            sheet.clear()
-            sheet.update([df.columns.values.tolist()] + df.values.tolist())
+            dati.write_data(sheet, df, expected_rows=st.session_state.get("data_rows"))
             st.success("✅ Dati salvati con successo!")
             
-            # FIX: Pulizia cache più selettiva
-            load_data.clear()
+            try:
+                dati.write_snapshots(df, df.columns)
+            except Exception:
+                pass  # la copia locale verrà riscritta al prossimo caricamento
+            
+            # NUOVO: Il DataFrame appena scritto diventa il nuovo snapshot condiviso:
+            # nessuna sessione deve riscaricare il foglio. Si svuotano solo le note.
+            replace_snapshot(df)
+            load_headers.clear()
+            load_notes.clear()
+            load_player_notes.clear()
             
             rows_info = f"Righe utilizzate: {len(df)+1}/10,000,000 (Google Sheets supporta fino a 10 milioni di righe)"
             st.session_state.rows_info = rows_info
+            return True
             
+        except dati.SheetChangedError:
+            # Qualcun altro ha aggiunto o tolto righe dopo il caricamento di questi dati
+            reload_snapshot()
+            st.error("❌ Il foglio è stato modificato nel frattempo (da un'altra sessione o da un import): "
+                     "i dati sono stati ricaricati. La modifica non è stata salvata, ripetila sui dati aggiornati.")
+            return False
         except Exception as e:
             st.error(f"❌ Errore nel salvataggio: {str(e)}")
-    else:
+            return False
+    elif sheet:
+        # Foglio tornato raggiungibile, ma questi dati non vengono da lui (es. dati demo
+        # mostrati dopo una lettura fallita): riscriverlo cancellerebbe il suo contenuto
+        clear_data_cache()
+        st.error("❌ I dati mostrati non sono stati letti dal foglio: le modifiche non sono state salvate. "
+                 "Ricarica la pagina e riprova.")
+        return False
+    elif st.session_state.get("data_source") == "demo":
         st.info("💾 Modalità demo - i dati non vengono salvati permanentemente")
+        return True
+    else:
+        st.error("❌ Foglio non raggiungibile: le modifiche non sono state salvate. Riprova più tardi.")
+        return False
+
+# NUOVO: Log delle modifiche append-only (vedi dati.py)
+@st.cache_resource
+def demo_changelog():
+    return []
+
+def init_changelog():
+    """Restituisce il foglio del log (creandolo se serve) o una lista in modalità demo"""
+    sheet = init_gsheet()
+    if not sheet:
+        return demo_changelog()
+    
+    # Il foglio del log è legato alla connessione corrente: se questa viene ricreata, lo è anche lui
+    conn = gsheet_connection()
+    if conn.get("changelog_for") is not sheet:
+        conn["changelog"], conn["changelog_for"] = dati.open_changelog(sheet), sheet
+    return conn["changelog"]
+
+def log_change(operation, row_index, player):
+    """Aggiunge una voce al log: player è la riga completa dopo la modifica (prima, se eliminata)"""
+    # In modalità demo save_data non modifica lo snapshot: una voce descriverebbe
+    # una modifica mai avvenuta e disallineerebbe lo storico
+    if st.session_state.get("data_source") == "demo":
+        return
+    entry = dati.make_log_entry(st.session_state.get("username", ""), operation, row_index, player)
+    publish_deltas([make_delta(operation, row_index, player)])
+    try:
+        dati.append_log_entries(init_changelog(), [entry])
+        load_changes.clear()
+    except Exception as e:
+        st.warning(f"⚠️ Modifica salvata ma non registrata nel log: {str(e)}")
+
+# NUOVO: Canale publish/subscribe tra le sessioni dello stesso processo.
+# Ogni scrittura pubblica una variazione di riga, etichettata con la versione dello
+# snapshot che la contiene; le altre sessioni la ricevono al successivo rerun (che
+# watch_changes provoca entro CHANGES_POLL_SECONDS) senza chiamate al foglio.
+CHANGES_POLL_SECONDS = 5
+
+@st.cache_resource
+def change_bus():
+    return {"lock": threading.Lock(), "deltas": deque(maxlen=500)}
+
+def make_delta(operation, row_index, player, user=None):
+    """Variazione di riga della versione corrente; con user è una modifica automatica,
+    notificata a tutte le sessioni (compresa quella che l'ha eseguita)"""
+    return {
+        "version": snapshot_version(),
+        "session_id": None if user else st.session_state.get("session_id"),
+        "utente": user or st.session_state.get("username", ""),
+        "operazione": operation,
+        "riga": int(row_index),
+        "nome": str(player.get("Nome Giocatore", ""))
+    }
+
+def publish_deltas(deltas):
+    """Pubblica insieme le variazioni della stessa versione, così chi legge le vede tutte o nessuna"""
+    bus = change_bus()
+    with bus["lock"]:
+        bus["deltas"].extend(deltas)
+
+def deltas_since(version):
+    bus = change_bus()
+    with bus["lock"]:
+        return [delta for delta in bus["deltas"] if delta["version"] > version]
+
+def deltas_between(since_version, version):
+    """Variazioni che portano dallo snapshot since_version a version, o None se in mezzo
+    c'è un ricaricamento completo o ne manca qualcuna (allora va ricalcolato tutto)"""
+    if data_store()["reloaded_version"] > since_version:
+        return None
+    deltas = [delta for delta in deltas_since(since_version) if delta["version"] <= version]
+    if {delta["version"] for delta in deltas} >= set(range(since_version + 1, version + 1)):
+        return deltas
+    return None
+
+def apply_remote_changes():
+    """Notifica le modifiche fatte da altre sessioni e aggiorna lo stato di questa"""
+    seen_version = st.session_state.get("seen_version", snapshot_version())
+    for delta in deltas_since(seen_version):
+        if delta["session_id"] == st.session_state.session_id:
+            continue
+        st.toast(f"🔄 {delta['nome']}: {delta['operazione']} da {delta['utente']}")
+        
+        # Le righe rimosse spostano gli indici: la selezione deve seguire il giocatore
+        if delta["operazione"] in ("eliminazione", "archiviazione"):
+            if st.session_state.selected_player_index > delta["riga"]:
+                st.session_state.selected_player_index -= 1
+            elif st.session_state.selected_player_index == delta["riga"]:
+                st.session_state.selected_player_index = 0
+            st.session_state.pop("player_selector", None)
+    st.session_state.seen_version = snapshot_version()
+
+@st.fragment(run_every=CHANGES_POLL_SECONDS)
+def watch_changes():
+    """Riesegue la pagina quando un'altra sessione pubblica una modifica"""
+    deltas = deltas_since(st.session_state.get("seen_version", snapshot_version()))
+    if any(delta["session_id"] != st.session_state.session_id for delta in deltas):
+        st.rerun()
+
+# NUOVO: Shortlist e preset di filtri salvati (vedi dati.py)
+@st.cache_resource
+def demo_shortlists():
+    return []
+
+def init_shortlists():
+    """Foglio delle shortlist (legato alla connessione corrente) o lista in modalità demo"""
+    sheet = init_gsheet()
+    if not sheet:
+        return demo_shortlists()
+    conn = gsheet_connection()
+    if conn.get("shortlists_for") is not sheet:
+        conn["shortlists"], conn["shortlists_for"] = dati.open_shortlists(sheet), sheet
+    return conn["shortlists"]
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_shortlists():
+    return dati.read_shortlists(init_shortlists())
+
+def store_shortlist(shortlist):
+    try:
+        dati.save_shortlist(init_shortlists(), shortlist)
+        load_shortlists.clear()
+        return True
+    except Exception as e:
+        st.error(f"❌ Errore nel salvataggio della shortlist: {str(e)}")
+        return False
+
+def remove_shortlist(name):
+    try:
+        dati.delete_shortlist(init_shortlists(), name)
+        load_shortlists.clear()
+    except Exception as e:
+        st.error(f"❌ Errore nell'eliminazione della shortlist: {str(e)}")
+
+@st.cache_resource
+def shortlist_results():
+    return {"lock": threading.Lock(), "results": {}}
+
+def shortlist_rows(shortlist, df):
+    """Posizioni in df dei giocatori della shortlist.
+    Il risultato è materializzato per versione dello snapshot: se tutte le versioni
+    successive vengono da modifiche pubblicate sul canale, si rivalutano solo le righe
+    toccate; se in mezzo c'è un ricaricamento dal foglio (anche se seguito da
+    archiviazioni) o manca qualche variazione, si rifiltra tutto."""
+    filters = shortlist["Filtri"]
+    
+    def full_rows():
+        mask = dati.filter_mask(df, filters).to_numpy()
+        return {row for row, match in enumerate(mask) if match}
+    
+    store = data_store()
+    if df is not store["df"]:
+        return full_rows()
+    version = store["version"]
+    
+    results = shortlist_results()
+    key = (shortlist["Nome"], json.dumps(filters, sort_keys=True))
+    with results["lock"]:
+        cached = results["results"].get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+        
+        deltas = deltas_between(cached[0], version) if cached else None
+        rows = dati.update_materialized(cached[1], df, filters, deltas) if deltas is not None else full_rows()
+        results["results"][key] = (version, rows)
+        return rows
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_changes(since_seq=0):
+    return dati.read_changes(init_changelog(), since_seq)
+
+# NUOVO: Archiviazione automatica dei giocatori inattivi (vedi dati.py).
+# Viene eseguita da load_data subito dopo un download dal foglio, mai su uno snapshot
+# in cache o sulla copia locale, e non mostra messaggi: l'utente che la provoca
+# sta solo aprendo la pagina.
+ARCHIVE_USER = "archiviazione automatica"
+
+@st.cache_resource
+def archive_state():
+    return {"last_run": 0.0, "error": None}
+
+def archive_stale_players(df):
+    """Sposta i giocatori inattivi di df (appena scaricato) negli archivi, al massimo una
+    volta al giorno. Restituisce le (riga, giocatore) archiviate, in ordine decrescente."""
+    sheet = init_gsheet()
+    state = archive_state()
+    if not sheet or time.time() - state["last_run"] < 86400:
+        return []
+    state["last_run"] = time.time()
+    
+    stale = stale_players_mask(df)
+    if not stale.any():
+        return []
+    
+    try:
+        headers = load_headers()
+        notes = dati.fetch_notes(sheet, headers)
+        if len(notes) != len(df):
+            return []  # righe aggiunte o tolte nel frattempo: si riproverà domani
+        df_full = dati.merge_notes(df, notes, headers)
+        
+        # Prima gli archivi (scrittura idempotente), poi il foglio attivo: se questo
+        # fallisce, il prossimo tentativo non duplica i giocatori già archiviati
+        dati.write_archive(sheet, df_full[stale])
+        remaining = df_full[~stale].reset_index(drop=True)
+        dati.write_data(sheet, remaining, expected_rows=len(df))
+    except Exception as e:
+        state["error"] = e
+        return []
+    state["error"] = None
+    
+    try:
+        dati.write_snapshots(remaining, remaining.columns)
+    except Exception:
+        pass
+    
+    # Indici decrescenti, così la riapplicazione del log rimuove le righe giuste
+    archived = [(row, df_full.loc[row].to_dict()) for row in sorted(df_full.index[stale], reverse=True)]
+    try:
+        dati.append_log_entries(
+            init_changelog(),
+            [dati.make_log_entry(ARCHIVE_USER, "archiviazione", row, player) for row, player in archived]
+        )
+        load_changes.clear()
+    except Exception:
+        pass  # i giocatori restano consultabili negli archivi
+    load_notes.clear()
+    load_player_notes.clear()
+    load_archive.clear()
+    return archived
+
+@st.cache_data(ttl=300, show_spinner="Caricamento archivio...")
+def load_archive():
+    sheet = init_gsheet()
+    if not sheet:
+        return pd.DataFrame()
+    return dati.read_archive(sheet)
+
+# NUOVO: Indice per il rilevamento duplicati (vedi dati.py)
+def load_duplicate_index(df):
+    """Indice di df, legato al DataFrame da cui è costruito (lo snapshot può cambiare
+    durante l'esecuzione). Dopo aggiunte e modifiche l'indice esistente viene esteso con
+    le sole righe toccate; si ricostruisce da zero solo dopo eliminazioni o ricaricamenti."""
+    store = data_store()
+    with store["index_lock"]:
+        cached = store["duplicate_index"]
+        if cached is not None and cached[0] is df:
+            return cached[2]
+        if df is not store["df"]:
+            return build_duplicate_index(df)
+        
+        version = store["version"]
+        deltas = deltas_between(cached[1], version) if cached is not None else None
+        if deltas is not None and all(delta["operazione"] not in ("eliminazione", "archiviazione") for delta in deltas):
+            # Le chiavi dei valori precedenti di una riga modificata restano: producono
+            # solo candidati in più, scartati dal punteggio
+            index = cached[2]
+            for row in sorted({delta["riga"] for delta in deltas}):
+                if row < len(df):
+                    player = df.iloc[row]
+                    dati.add_to_duplicate_index(index, row, player["Nome Giocatore"], player["Squadra"], player.get("Età"))
+        else:
+            index = build_duplicate_index(df)
+        store["duplicate_index"] = (df, version, index)
+        return index
 
 # Funzione per convertire stringhe di date in oggetti date
 def safe_date_convert(date_str):
@@ -287,15 +782,6 @@ def safe_date_convert(date_str):
     except:
         return date.today()
 
-# Funzione per conversione sicura dei numeri
-def safe_int_convert(value, default=0):
-    try:
-        if pd.isna(value) or value == '' or value is None:
-            return default
-        return int(float(str(value)))
-    except (ValueError, TypeError):
-        return default
-
 # FIX: Gestione robusta del logout con pulizia URL
 def handle_logout():
     """Gestisce il logout in modo pulito"""
@@ -318,6 +804,9 @@ def handle_logout():
 
 # Funzione principale dell'app
 def main():
+    # NUOVO: Connessione e dati vengono preparati in background già durante il login
+    start_warmup()
+    
     # FIX: Inizializzazione robusta all'avvio con controllo URL
     initialize_session_state()
     keep_session_alive()
@@ -380,12 +869,21 @@ def main():
         
         # FIX: Pulsante per refresh dati
         if st.button("🔄 Aggiorna Dati", key="refresh_data"):
-            load_data.clear()
+            clear_data_cache()
             st.rerun()
 
     # FIX: Caricamento dati con session_id per stabilità
     df = load_data(_session_id=st.session_state.session_id)
-
+    show_connection_status()
+    
+    # NUOVO: Modifiche delle altre sessioni, ricevute senza ricaricare il foglio
+    apply_remote_changes()
+    with st.sidebar:
+        watch_changes()
+    
+    if len(df) > 0 and "rows_info" not in st.session_state:
+        st.session_state.rows_info = f"Righe utilizzate: {len(df)+1}/10,000,000 (Google Sheets supporta fino a 10 milioni di righe)"
+    
     # Tabs con gestione migliorata
     tab_names = ["📊 Dashboard", "➕ Aggiungi Giocatore", "✏️ Modifica Dati", "🔍 Ricerca"]
     selected_tab = st.tabs(tab_names)
@@ -417,41 +915,115 @@ def main():
             
             # Filtri di ricerca
             st.subheader("🔍 Filtri di Ricerca")
-            col_search1, col_search2, col_search3 = st.columns(3)
+            # NUOVO: Shortlist salvate: il risultato è già materializzato, non si rifiltra
+            shortlists = load_shortlists()
+            selected_shortlist_name = st.selectbox(
+                "⭐ Shortlist", ["—"] + [shortlist["Nome"] for shortlist in shortlists], key="shortlist_dash"
+            )
+            selected_shortlist = next((sl for sl in shortlists if sl["Nome"] == selected_shortlist_name), None)
+            
+            col_search1, col_search2, col_search3, col_search4 = st.columns(4)
             
             with col_search1:
-                search_name_dash = st.text_input("🔍 Cerca per Nome", key="search_dash")
+                search_name_dash = st.text_input("🔍 Cerca per Nome", key="search_dash",
+                                                 disabled=selected_shortlist is not None)
                 
             with col_search2:
-                filter_squad_dash = st.multiselect("Filtra per Squadra", options=df["Squadra"].unique(), key="squad_dash")
+                filter_squad_dash = st.multiselect("Filtra per Squadra", options=df["Squadra"].unique(), key="squad_dash",
+                                                   disabled=selected_shortlist is not None)
                 
             with col_search3:
-                filter_role_dash = st.multiselect("Filtra per Ruolo", options=df["Ruolo"].unique(), key="role_dash")
+                filter_role_dash = st.multiselect("Filtra per Ruolo", options=df["Ruolo"].unique(), key="role_dash",
+                                                  disabled=selected_shortlist is not None)
             
-            # Applica filtri
-            filtered_df = df.copy()
-            
-            if search_name_dash:
-                filtered_df = filtered_df[filtered_df["Nome Giocatore"].str.contains(search_name_dash, case=False, na=False)]
+            with col_search4:
+                filter_flags_dash = st.multiselect("Filtra per Valutazione", options=dati.FLAG_COLUMNS, key="flags_dash",
+                                                   disabled=selected_shortlist is not None)
             
-            if filter_squad_dash:
-                filtered_df = filtered_df[filtered_df["Squadra"].isin(filter_squad_dash)]
-                
-            if filter_role_dash:
-                filtered_df = filtered_df[filtered_df["Ruolo"].isin(filter_role_dash)]
+            # Applica filtri
+            current_filters = {
+                "nome": search_name_dash,
+                "squadre": list(filter_squad_dash),
+                "ruoli": list(filter_role_dash),
+                "valutazioni": list(filter_flags_dash)
+            }
+            if selected_shortlist:
+                filtered_df = df.iloc[sorted(row for row in shortlist_rows(selected_shortlist, df) if row < len(df))]
+            else:
+                filtered_df = df[dati.filter_mask(df, current_filters)]
             
             # NUOVO: Inverti l'ordine per mostrare gli ultimi inseriti per primi
-            filtered_df = filtered_df.iloc[::-1].reset_index(drop=True)
+            # (l'indice originale resta per poter agganciare le note)
+            filtered_df = filtered_df.iloc[::-1]
             
             st.info(f"📊 Visualizzati **{len(filtered_df)}** giocatori su {len(df)} totali")
             
+            # NUOVO: Salvataggio, confronto nel tempo ed export delle shortlist
+            with st.expander("⭐ Gestisci shortlist"):
+                if selected_shortlist:
+                    current_names = filtered_df["Nome Giocatore"].astype(str).tolist()
+                    fixed = selected_shortlist["Ultimo risultato"]
+                    st.caption(f"Filtri: {json.dumps(selected_shortlist['Filtri'], ensure_ascii=False)} - "
+                               f"creata da {selected_shortlist['Creata da']}")
+                    
+                    if fixed:
+                        entered = sorted(set(current_names) - set(fixed["giocatori"]))
+                        left = sorted(set(fixed["giocatori"]) - set(current_names))
+                        st.write(f"Rispetto al risultato fissato il {fixed['data']} "
+                                 f"({len(fixed['giocatori'])} giocatori):")
+                        st.write("🆕 Entrati: " + (", ".join(entered) or "nessuno"))
+                        st.write("👋 Usciti: " + (", ".join(left) or "nessuno"))
+                    
+                    col_fix, col_export, col_remove = st.columns(3)
+                    with col_fix:
+                        if st.button("📌 Fissa risultato attuale", key="shortlist_fix"):
+                            updated = dict(selected_shortlist, Aggiornata=date.today().strftime("%Y-%m-%d"))
+                            updated["Ultimo risultato"] = {
+                                "data": date.today().strftime("%Y-%m-%d"),
+                                "giocatori": current_names
+                            }
+                            if store_shortlist(updated):
+                                st.rerun()
+                    with col_export:
+                        st.download_button(
+                            "📤 Esporta CSV",
+                            filtered_df.to_csv(index=False).encode("utf-8"),
+                            file_name=f"shortlist-{selected_shortlist['Nome']}.csv",
+                            mime="text/csv",
+                            key="shortlist_export"
+                        )
+                    with col_remove:
+                        if st.button("🗑️ Elimina shortlist", key="shortlist_remove"):
+                            remove_shortlist(selected_shortlist["Nome"])
+                            del st.session_state.shortlist_dash
+                            st.rerun()
+                else:
+                    shortlist_name = st.text_input("Nome della shortlist", key="shortlist_name")
+                    if st.button("💾 Salva filtri attuali come shortlist", key="shortlist_save"):
+                        if not shortlist_name:
+                            st.error("❌ Inserisci un nome per la shortlist!")
+                        elif store_shortlist({
+                            "Nome": shortlist_name,
+                            "Filtri": current_filters,
+                            "Creata da": st.session_state.username,
+                            "Aggiornata": date.today().strftime("%Y-%m-%d"),
+                            "Ultimo risultato": None
+                        }):
+                            st.success(f"✅ Shortlist \"{shortlist_name}\" salvata!")
+                            st.rerun()
+            
+            # NUOVO: Le note vengono scaricate solo se richieste
+            show_notes = st.toggle("📝 Mostra note e risposte di Miniero", key="show_notes_dash")
+            if show_notes:
+                filtered_df = with_notes(filtered_df)
+            
             st.divider()
             
             # Sezione Anagrafica Giocatore - ORDINE MODIFICATO CON LIVELLI DOPO NOME
             st.subheader("👤 Anagrafica Giocatore")
             
             # Prepara il dataframe
-            df_anagrafica = filtered_df.copy()
+            df_anagrafica = filtered_df.copy(deep=False)
             
             # Aggiungi una colonna indicatore visivo per "Da Monitorare"
             if "Da Monitorare" in df_anagrafica.columns:
@@ -489,7 +1061,7 @@ def main():
             st.subheader("📊 Nostra Analisi")
             
             # Prepara il dataframe
-            df_analisi_full = filtered_df.copy()
+            df_analisi_full = filtered_df.copy(deep=False)
             
             # Modifica la colonna "Da Monitorare" per renderla più visibile
             if "Da Monitorare" in df_analisi_full.columns:
@@ -525,8 +1097,11 @@ def main():
             # Sezione Nostre Note - ORDINE MODIFICATO CON LIVELLI DOPO NOME
             st.subheader("📝 Nostre Note")
             
+            if not show_notes:
+                st.caption("Attiva \"📝 Mostra note e risposte di Miniero\" per caricare le note.")
+            
             # Prepara il dataframe
-            df_note_full = filtered_df.copy()
+            df_note_full = filtered_df.copy(deep=False)
             
             # Aggiungi una colonna indicatore visivo per "Da Monitorare"
             if "Da Monitorare" in df_note_full.columns:
@@ -541,19 +1116,20 @@ def main():
             
             df_note = df_note_full[[col for col in note_cols if col in df_note_full.columns]].reset_index(drop=True)
             
-            st.dataframe(
-                df_note, 
-                use_container_width=True, 
-                hide_index=True, 
-                height=400,
-                column_config={
-                    "🔔 Monitor": st.column_config.TextColumn(
-                        "Monitor",
-                        help="⭐ indica giocatori da monitorare",
-                        width="small"
-                    )
-                }
-            )
+            if show_notes:
+                st.dataframe(
+                    df_note, 
+                    use_container_width=True, 
+                    hide_index=True, 
+                    height=400,
+                    column_config={
+                        "🔔 Monitor": st.column_config.TextColumn(
+                            "Monitor",
+                            help="⭐ indica giocatori da monitorare",
+                            width="small"
+                        )
+                    }
+                )
             
         else:
             st.info("Nessun giocatore nel database. Inizia aggiungendo un nuovo giocatore!")
@@ -616,7 +1192,19 @@ def main():
             link_transfermarkt = st.text_input("Link Transfermarkt", placeholder="https://www.transfermarkt.it/...")
             
             if st.form_submit_button("➕ Aggiungi Giocatore"):
-                if nome and squadra:
+                # NUOVO: Avviso sui possibili duplicati, confermato con un secondo click
+                duplicates = find_duplicates(df, load_duplicate_index(df), nome, squadra, eta) if nome and squadra else []
+                duplicate_key = (normalize_name(nome), normalize_name(squadra))
+                if duplicates and st.session_state.get("confirm_duplicate") != duplicate_key:
+                    st.session_state.confirm_duplicate = duplicate_key
+                    st.warning("⚠️ Possibili duplicati già presenti nel database:")
+                    for row, score in duplicates[:5]:
+                        st.write(f"- {df.iloc[row]['Nome Giocatore']} - {df.iloc[row]['Squadra']} "
+                                 f"(Età {df.iloc[row].get('Età', '')}, somiglianza {score:.0%})")
+                    st.warning("Clicca di nuovo su \"➕ Aggiungi Giocatore\" per inserirlo comunque.")
+                elif nome and squadra:
+                    if "confirm_duplicate" in st.session_state:
+                        del st.session_state.confirm_duplicate
                     new_player = {
                         "Nome Giocatore": nome,
                         "Squadra": squadra,
@@ -648,9 +1236,10 @@ def main():
                         "Link Transfermarkt": link_transfermarkt
                     }
                     
-                    df_new = pd.concat([df, pd.DataFrame([new_player])], ignore_index=True)
-                    save_data(df_new)
-                    st.info(f"✅ Giocatore aggiunto! Totale giocatori nel database: {len(df_new)}")
+                    df_new = pd.concat([with_notes(df), pd.DataFrame([new_player])], ignore_index=True)
+                    if save_data(df_new):
+                        log_change("aggiunta", len(df_new) - 1, new_player)
+                        st.info(f"✅ Giocatore aggiunto! Totale giocatori nel database: {len(df_new)}")
                 else:
                     st.error("❌ Nome e Squadra sono campi obbligatori!")
 
@@ -683,6 +1272,10 @@ def main():
             
             if selected_player is not None:
                 player_data = df.iloc[selected_player]
+                # NUOVO: Note lette solo per il giocatore selezionato
+                player_notes = load_player_notes(selected_player)
+                if str(player_notes.get("Nome Giocatore", "")) != str(player_data["Nome Giocatore"]):
+                    stop_on_changed_data()
                 
                 with st.form("edit_player_form", clear_on_submit=False):
                     st.subheader(f"Modifica: {player_data['Nome Giocatore']}")
@@ -756,11 +1349,11 @@ def main():
                                                        value=player_data.get("Presentato a Miniero") == "X")
                     
                     note_danilo = st.text_area("Note Danilo/Antonio", 
-                                             value=str(player_data.get("Note Danilo/Antonio", "")))
+                                             value=str(player_notes.get("Note Danilo/Antonio", "")))
                     note_alessio = st.text_area("Note Alessio/Fabrizio", 
-                                              value=str(player_data.get("Note Alessio/Fabrizio", "")))
+                                              value=str(player_notes.get("Note Alessio/Fabrizio", "")))
                     risposta_miniero = st.text_area("Risposta Miniero", 
-                                                  value=str(player_data.get("Risposta Miniero", "")))
+                                                  value=str(player_notes.get("Risposta Miniero", "")))
                     
                     link_transfermarkt = st.text_input("Link Transfermarkt", 
                                                       value=str(player_data.get("Link Transfermarkt", "")),
@@ -773,6 +1366,7 @@ def main():
                                 # Mantieni la sessione attiva durante il salvataggio
                                 keep_session_alive()
                                 
+                                df = with_notes(df)
                                 df.loc[selected_player, "Nome Giocatore"] = nome
                                 df.loc[selected_player, "Squadra"] = squadra
                                 df.loc[selected_player, "Età"] = eta
@@ -802,8 +1396,9 @@ def main():
                                 df.loc[selected_player, "Livello 1 Prospettiva"] = "X" if livello_1_prospettiva else ""
                                 df.loc[selected_player, "Link Transfermarkt"] = link_transfermarkt
                                 
-                                save_data(df)
-                                st.success("✅ Modifiche salvate con successo!")
+                                if save_data(df):
+                                    log_change("modifica", selected_player, df.loc[selected_player].to_dict())
+                                    st.success("✅ Modifiche salvate con successo!")
                             else:
                                 st.error("❌ Nome e Squadra sono campi obbligatori!")
                     
@@ -811,17 +1406,54 @@ def main():
                         if st.form_submit_button("🗑️ Elimina Giocatore", type="secondary"):
                             # FIX: Conferma eliminazione più robusta
                             if st.session_state.get("confirm_delete", False):
-                                df_updated = df.drop(selected_player).reset_index(drop=True)
-                                save_data(df_updated)
-                                st.session_state.selected_player_index = 0
+                                df_full = with_notes(df)
+                                df_updated = df_full.drop(selected_player).reset_index(drop=True)
                                 if "confirm_delete" in st.session_state:
                                     del st.session_state.confirm_delete
-                                st.success("✅ Giocatore eliminato!")
-                                keep_session_alive()
-                                st.rerun()
+                                if save_data(df_updated):
+                                    log_change("eliminazione", selected_player, df_full.loc[selected_player].to_dict())
+                                    st.session_state.selected_player_index = 0
+                                    st.success("✅ Giocatore eliminato!")
+                                    keep_session_alive()
+                                    st.rerun()
                             else:
                                 st.session_state.confirm_delete = True
                                 st.warning("⚠️ Clicca di nuovo per confermare l'eliminazione!")
+                
+                # NUOVO: Storico modifiche del giocatore e ripristino di una versione precedente
+                with st.expander("📜 Storico modifiche"):
+                    history = dati.player_history(load_changes(), selected_player)
+                    
+                    if history.empty:
+                        st.info("Nessuna modifica registrata per questo giocatore.")
+                    elif history["Nome Giocatore"].iloc[-1] != str(player_data["Nome Giocatore"]):
+                        # L'ultima voce deve descrivere il giocatore così com'è ora, altrimenti
+                        # log e dati non sono allineati e le righe potrebbero essere di un altro
+                        st.warning("⚠️ Lo storico non è allineato ai dati attuali: clicca \"🔄 Aggiorna Dati\" e riprova.")
+                    else:
+                        st.dataframe(
+                            history[["Seq", "Timestamp", "Utente", "Operazione"]].iloc[::-1],
+                            use_container_width=True,
+                            hide_index=True
+                        )
+                        
+                        version_seq = st.selectbox(
+                            "Versione da ripristinare",
+                            options=history["Seq"].tolist()[::-1],
+                            format_func=lambda seq: f"#{seq} - {history.loc[history['Seq'] == seq, 'Timestamp'].iloc[0]}",
+                            key="restore_version"
+                        )
+                        
+                        if st.button("↩️ Ripristina versione", key="restore_btn"):
+                            keep_session_alive()
+                            version = json.loads(history.loc[history["Seq"] == version_seq, "Dati"].iloc[0])
+                            df = with_notes(df)
+                            for col_name, value in version.items():
+                                df.loc[selected_player, col_name] = value
+                            
+                            if save_data(df):
+                                log_change("ripristino", selected_player, df.loc[selected_player].to_dict())
+                                st.success(f"✅ Ripristinata la versione #{version_seq}")
         else:
             st.info("Nessun giocatore disponibile per la modifica.")
 
@@ -841,8 +1473,13 @@ def main():
             with col3:
                 filter_role = st.multiselect("Filtra per Ruolo", options=df["Ruolo"].unique())
             
+            # NUOVO: Gli archivi vengono letti solo se richiesti
+            include_archive = st.checkbox("🗄️ Includi giocatori in archivio", key="search_archive")
+            
             # Applica filtri
-            filtered_df = df.copy()
+            filtered_df = df.copy(deep=False)
+            if include_archive:
+                filtered_df = pd.concat([filtered_df, load_archive()], ignore_index=True)
             
             if search_name:
                 filtered_df = filtered_df[filtered_df["Nome Giocatore"].str.contains(search_name, case=False, na=False)]
@@ -856,7 +1493,7 @@ def main():
             st.subheader(f"Risultati ({len(filtered_df)} giocatori)")
             
             # Prepara il dataframe per la ricerca
-            df_search = filtered_df.copy()
+            df_search = filtered_df.copy(deep=False)
             
             # Modifica la colonna "Da Monitorare" per renderla più visibile
             if "Da Monitorare" in df_search.columns:
@@ -0,0 +1,283 @@
+"""Riga di comando per le operazioni senza interfaccia web (cron, export, controlli).
+
+Usa lo stesso livello dati dell'app (dati.py) senza importare Streamlit.
+Le credenziali sono lette dallo stesso secrets.toml dell'app.
+
+Esempi:
+    python cli.py sync
+    python cli.py export giocatori.csv
+    python cli.py import nuovi.csv --utente fabrizio
+    python cli.py bench
+    python cli.py verify
+"""
+import argparse
+import json
+import sys
+import time
+import tomllib
+from pathlib import Path
+
+# Relativo all'app e non alla cartella corrente: da cron la cartella corrente è di solito $HOME
+DEFAULT_SECRETS = Path(__file__).resolve().parent / ".streamlit" / "secrets.toml"
+
+# dati (pandas, gspread) viene importato solo dentro i comandi: così --help e gli
+# errori sugli argomenti restano immediati.
+
+def open_sheet(args):
+    """Foglio principale, o None con --demo"""
+    import dati
+
+    if args.demo:
+        return None
+    secrets_path = Path(args.secrets)
+    if not secrets_path.exists():
+        sys.exit(f"❌ File dei secrets non trovato: {secrets_path} (usa --secrets o --demo)")
+    secrets = tomllib.loads(secrets_path.read_text())
+    if "gsheet_credentials" not in secrets:
+        sys.exit(f"❌ Credenziali Google Sheets non configurate in {secrets_path}")
+    return dati.connect_gsheet(secrets["gsheet_credentials"], secrets.get("sheet_id", dati.DEFAULT_SHEET_ID))
+
+def load_full_data(sheet):
+    import dati
+
+    if sheet is None:
+        return dati.sample_data()
+    return dati.fetch_full_data(sheet)
+
+def read_table(path):
+    """CSV o JSON (lista di record) con tutti i valori come testo, celle vuote comprese"""
+    import pandas as pd
+
+    if path.suffix == ".json":
+        return pd.DataFrame(json.loads(path.read_text())).fillna("")
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+def write_table(df, path):
+    if path.suffix == ".json":
+        path.write_text(df.to_json(orient="records", force_ascii=False, indent=2))
+    else:
+        df.to_csv(path, index=False)
+
+# Comandi
+
+def cmd_sync(args):
+    """Aggiorna la copia locale (Parquet, la stessa usata dall'app all'avvio e offline):
+    riapplica solo le voci del log successive all'ultima sincronizzazione"""
+    import dati
+
+    sheet = open_sheet(args)
+    if sheet is None:
+        sys.exit("❌ sync richiede la connessione al foglio")
+    log = dati.open_changelog(sheet)
+
+    directory = args.dir or dati.SNAPSHOT_DIR
+    df, metadata = dati.read_full_snapshot(directory)
+
+    # Le copie scritte dall'app non hanno "seq": in quel caso serve un download completo
+    if df is not None and "seq" in metadata and not args.full:
+        changes = dati.read_changes(log, metadata["seq"])
+        df = dati.apply_changes(df, changes)
+        seq = metadata["seq"] + len(changes)
+        print(f"🔄 Riapplicate {len(changes)} modifiche (seq {metadata['seq']} -> {seq})")
+    else:
+        # Il numero di voci del log deve essere lo stesso prima e dopo il download,
+        # altrimenti una modifica concorrente potrebbe essere persa o applicata due volte
+        for _ in range(3):
+            seq = len(dati.read_changes(log))
+            df = dati.fetch_full_data(sheet)
+            if len(dati.read_changes(log, seq)) == 0:
+                break
+        else:
+            sys.exit("❌ Il foglio continua a cambiare durante il download, riprova più tardi")
+        print(f"⬇️ Download completo: {len(df)} giocatori (seq {seq})")
+
+    dati.write_snapshots(df, df.columns, {"seq": seq}, directory)
+
+def cmd_export(args):
+    """Esporta tutti i giocatori (note comprese) in CSV o JSON"""
+    import pandas as pd
+    import dati
+
+    sheet = open_sheet(args)
+    df = load_full_data(sheet)
+    if args.archivio and sheet is not None:
+        df = pd.concat([df, dati.read_archive(sheet)], ignore_index=True)
+    write_table(df, Path(args.output))
+    print(f"📤 Esportati {len(df)} giocatori in {args.output}")
+
+def cmd_import(args):
+    """Aggiunge i giocatori di un file, saltando i probabili duplicati (salvo --forza)"""
+    import pandas as pd
+    import dati
+
+    players = read_table(Path(args.input))
+    missing = [c for c in ("Nome Giocatore", "Squadra") if c not in players.columns]
+    if missing:
+        sys.exit(f"❌ Colonne obbligatorie mancanti: {', '.join(missing)}")
+    unknown = [c for c in players.columns if c not in dati.HEADERS]
+    if unknown:
+        sys.exit(f"❌ Colonne sconosciute: {', '.join(unknown)}")
+    players = players[(players["Nome Giocatore"] != "") & (players["Squadra"] != "")]
+
+    sheet = open_sheet(args)
+    if sheet is None:
+        existing = dati.sample_data()
+        headers = list(existing.columns)
+    else:
+        headers = dati.fetch_headers(sheet)
+        if not headers:
+            sys.exit("❌ Il foglio non ha intestazioni: aprilo prima con l'app")
+        existing = dati.fetch_data(sheet, headers)
+
+    # L'indice contiene i giocatori esistenti e quelli già accettati da questo import
+    combined = pd.concat([existing, players], ignore_index=True)
+    index = dati.build_duplicate_index(existing)
+    accepted = []
+    for position, player in enumerate(players.to_dict("records")):
+        row = len(existing) + position
+        duplicates = dati.find_duplicates(combined, index, player["Nome Giocatore"], player["Squadra"], player.get("Età"))
+        if duplicates and not args.forza:
+            match, score = duplicates[0]
+            print(f"⚠️ Saltato {player['Nome Giocatore']} - {player['Squadra']}: simile a "
+                  f"{combined.iloc[match]['Nome Giocatore']} - {combined.iloc[match]['Squadra']} ({score:.0%})")
+            continue
+        dati.add_to_duplicate_index(index, row, player["Nome Giocatore"], player["Squadra"], player.get("Età"))
+        accepted.append({col_name: player.get(col_name, "") for col_name in headers})
+
+    if args.prova or sheet is None or not accepted:
+        print(f"✅ {len(accepted)} giocatori da importare su {len(players)} (nessuna scrittura)")
+        return
+
+    sheet.append_rows([[p[c] for c in headers] for p in accepted], value_input_option="RAW")
+    entries = [
+        dati.make_log_entry(args.utente, "aggiunta", len(existing) + i, player)
+        for i, player in enumerate(accepted)
+    ]
+    dati.append_log_entries(dati.open_changelog(sheet), entries)
+    print(f"✅ Importati {len(accepted)} giocatori su {len(players)}")
+
+def cmd_bench(args):
+    """Misura i tempi delle operazioni principali del livello dati"""
+    import dati
+
+    timings = []
+
+    def measure(label, func):
+        best = float("inf")
+        for _ in range(args.ripetizioni):
+            start = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - start)
+        timings.append((label, best))
+        return result
+
+    sheet = measure("connessione", lambda: open_sheet(args))
+    if sheet is None:
+        df = dati.sample_data()
+    else:
+        headers = measure("intestazioni", lambda: dati.fetch_headers(sheet))
+        df = measure("dati compatti (batch_get)", lambda: dati.fetch_data(sheet, headers))
+        measure("note (batch_get)", lambda: dati.fetch_notes(sheet, headers))
+        measure("foglio completo (get_all_records)", lambda: sheet.get_all_records())
+
+    index = measure("indice duplicati", lambda: dati.build_duplicate_index(df))
+    sample = df.head(100).to_dict("records")
+    measure(
+        f"ricerca duplicati x{len(sample)}",
+        lambda: [dati.find_duplicates(df, index, p["Nome Giocatore"], p["Squadra"], p.get("Età")) for p in sample]
+    )
+
+    print(f"Giocatori: {len(df)} (migliore di {args.ripetizioni} ripetizioni)")
+    for label, seconds in timings:
+        print(f"  {label:<36} {seconds * 1000:9.1f} ms")
+
+def cmd_verify(args):
+    """Controlli di integrità; termina con codice 1 se trova errori"""
+    import pandas as pd
+    import dati
+
+    sheet = open_sheet(args)
+    df = load_full_data(sheet)
+    errors, warnings = [], []
+
+    missing = [c for c in dati.HEADERS if c not in df.columns]
+    if missing:
+        errors.append(f"Colonne mancanti: {', '.join(missing)}")
+
+    for row, player in enumerate(df.to_dict("records")):
+        label = f"riga {row + 2} ({player.get('Nome Giocatore', '')})"
+        if not str(player.get("Nome Giocatore", "")).strip() or not str(player.get("Squadra", "")).strip():
+            errors.append(f"{label}: Nome Giocatore e Squadra sono obbligatori")
+        for col_name in dati.FLAG_COLUMNS:
+            if player.get(col_name, "") not in ("", "X"):
+                errors.append(f"{label}: valore non valido in {col_name}: {player[col_name]!r}")
+        for col_name in dati.DATE_COLUMNS:
+            value = player.get(col_name, "")
+            if value != "" and pd.isna(pd.to_datetime(value, format="%Y-%m-%d", errors="coerce")):
+                errors.append(f"{label}: data non valida in {col_name}: {value!r}")
+
+    if not missing:
+        index = dati.build_duplicate_index(df)
+        for row, player in enumerate(df.to_dict("records")):
+            for match, score in dati.find_duplicates(df, index, player["Nome Giocatore"], player["Squadra"], player.get("Età")):
+                if match > row:
+                    warnings.append(f"riga {row + 2} e riga {match + 2}: possibile duplicato "
+                                    f"({player['Nome Giocatore']}, {score:.0%})")
+
+    if sheet is not None:
+        changes = dati.read_changes(dati.open_changelog(sheet))
+        for change in changes.itertuples(index=False):
+            if change.Operazione not in dati.CHANGELOG_OPERATIONS:
+                errors.append(f"log #{change.Seq}: operazione sconosciuta {change.Operazione!r}")
+            try:
+                json.loads(change.Dati)
+            except ValueError:
+                errors.append(f"log #{change.Seq}: dati non leggibili")
+
+    for message in warnings:
+        print(f"⚠️ {message}")
+    for message in errors:
+        print(f"❌ {message}")
+    print(f"{'✅' if not errors else '❌'} {len(df)} giocatori controllati: {len(errors)} errori, {len(warnings)} avvisi")
+    if errors:
+        sys.exit(1)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Gestione Giocatori - riga di comando")
+    parser.add_argument("--secrets", default=str(DEFAULT_SECRETS),
+                        help="file secrets.toml con gsheet_credentials e sheet_id "
+                             "(predefinito: .streamlit/secrets.toml accanto all'app)")
+    parser.add_argument("--demo", action="store_true", help="usa i dati di esempio invece del foglio")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sync = commands.add_parser("sync", help="aggiorna la copia locale dal log delle modifiche")
+    sync.add_argument("--dir", help="cartella della copia locale (predefinita: snapshots/ accanto all'app)")
+    sync.add_argument("--full", action="store_true", help="riscarica tutto invece di riapplicare il log")
+    sync.set_defaults(func=cmd_sync)
+
+    export = commands.add_parser("export", help="esporta i giocatori in CSV o JSON")
+    export.add_argument("output", help="file di destinazione (.csv o .json)")
+    export.add_argument("--archivio", action="store_true", help="includi i giocatori in archivio")
+    export.set_defaults(func=cmd_export)
+
+    import_ = commands.add_parser("import", help="importa giocatori da CSV o JSON")
+    import_.add_argument("input", help="file da importare (.csv o .json)")
+    import_.add_argument("--utente", default="cli", help="utente registrato nel log delle modifiche")
+    import_.add_argument("--forza", action="store_true", help="importa anche i probabili duplicati")
+    import_.add_argument("--prova", action="store_true", help="mostra cosa verrebbe importato senza scrivere")
+    import_.set_defaults(func=cmd_import)
+
+    bench = commands.add_parser("bench", help="misura i tempi del livello dati")
+    bench.add_argument("--ripetizioni", type=int, default=3)
+    bench.set_defaults(func=cmd_bench)
+
+    verify = commands.add_parser("verify", help="controlli di integrità dei dati")
+    verify.set_defaults(func=cmd_verify)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
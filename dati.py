@@ -0,0 +1,600 @@
+"""Livello dati della gestione giocatori.
+
+Lettura e scrittura del foglio Google Sheets, log delle modifiche, archivi e
+rilevamento duplicati. Non importa Streamlit: è usato sia dall'app web
+(app-calcio.py) sia dalla riga di comando (cli.py).
+"""
+import json
+import os
+import unicodedata
+from collections import defaultdict
+from datetime import date, datetime
+from difflib import SequenceMatcher
+from pathlib import Path
+
+import gspread
+import pandas as pd
+from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_SHEET_ID = "1GjubMgZkxjISauMyrnQdZlunOUMEKKSGoEwk6tm7d4c"
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+# Intestazioni del foglio, nell'ordine usato quando il foglio viene inizializzato
+HEADERS = [
+    "Nome Giocatore", "Squadra", "Età", "Ruolo", "Valore di Mercato",
+    "Procuratore", "Altezza", "Piede", "Convocazioni", "Partite Giocate",
+    "Gol", "Assist", "Minuti Giocati", "Data Inizio Contratto",
+    "Data Fine Contratto", "Numero Visione Partite",
+    "Data inserimento in piattaforma", "Data ultima visione",
+    "Data presentazione a Miniero",
+    "Da Monitorare", "Note Danilo/Antonio", "Note Alessio/Fabrizio",
+    "Presentato a Miniero", "Risposta Miniero", "Livello 1", "Livello 2",
+    "Livello 1 Prospettiva", "Link Transfermarkt"
+]
+
+# Colonne di testo libero, pesanti e mostrate solo in alcune viste.
+# Non vengono scaricate con il resto dei dati ma caricate su richiesta.
+NOTE_COLUMNS = ["Note Danilo/Antonio", "Note Alessio/Fabrizio", "Risposta Miniero"]
+
+# Colonne aggiunte in versioni successive, con il valore per i fogli che non le hanno
+NEW_COLUMNS = {
+    "Numero Visione Partite": 0,
+    "Livello 1": "",
+    "Livello 2": "",
+    "Livello 1 Prospettiva": "",
+    "Link Transfermarkt": "",
+    "Data inserimento in piattaforma": "",
+    "Data ultima visione": "",
+    "Data presentazione a Miniero": ""
+}
+
+# Colonne "X" / vuoto
+FLAG_COLUMNS = ["Da Monitorare", "Presentato a Miniero", "Livello 1", "Livello 2", "Livello 1 Prospettiva"]
+
+DATE_COLUMNS = [
+    "Data Inizio Contratto", "Data Fine Contratto", "Data inserimento in piattaforma",
+    "Data ultima visione", "Data presentazione a Miniero"
+]
+
+class NotesMisalignedError(Exception):
+    """Le note scaricate non corrispondono più alle righe dei dati (foglio modificato nel frattempo)"""
+
+class SheetChangedError(Exception):
+    """Il foglio non ha più il numero di righe dei dati su cui si basa una riscrittura"""
+
+# Connessione
+
+HTTP_TIMEOUT = (5, 30)  # secondi: apertura della connessione, attesa della risposta
+
+def connect_gsheet(credentials_info, sheet_id=DEFAULT_SHEET_ID):
+    """Crea il client autorizzato su una sessione HTTP con keep-alive e apre il foglio principale"""
+    credentials = Credentials.from_service_account_info(credentials_info, scopes=SCOPES)
+
+    # Pool di connessioni riutilizzate tra le richieste, con retry sugli errori temporanei
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    )
+    session.mount("https://", adapter)
+
+    gc = gspread.Client(credentials, session=session)
+    # Senza timeout una connessione keep-alive morta resta appesa per sempre (e con lei
+    # chi attende il lock della connessione): così fallisce e viene ricreata
+    gc.set_timeout(HTTP_TIMEOUT)
+    sheet = gc.open_by_key(sheet_id).sheet1
+    sheet.get('A1:A1')
+    return sheet
+
+# Dati di esempio per la modalità demo
+def sample_data():
+    return pd.DataFrame({
+        "Nome Giocatore": ["Mario Rossi", "Luca Bianchi"],
+        "Squadra": ["Juventus", "Milan"],
+        "Età": [25, 28],
+        "Ruolo": ["Centrocampista", "Attaccante"],
+        "Valore di Mercato": ["15M€", "20M€"],
+        "Procuratore": ["Raiola", "Mendes"],
+        "Altezza": [180, 175],
+        "Piede": ["Destro", "Sinistro"],
+        "Convocazioni": [45, 52],
+        "Partite Giocate": [38, 41],
+        "Gol": [8, 15],
+        "Assist": [12, 7],
+        "Minuti Giocati": [3200, 3650],
+        "Data Inizio Contratto": ["2022-07-01", "2021-08-15"],
+        "Data Fine Contratto": ["2025-06-30", "2024-07-31"],
+        "Numero Visione Partite": [5, 8],
+        "Data inserimento in piattaforma": ["2024-01-15", "2024-02-20"],
+        "Data ultima visione": ["2024-03-10", "2024-03-25"],
+        "Data presentazione a Miniero": ["2024-02-01", ""],
+        "Da Monitorare": ["X", ""],
+        "Note Danilo/Antonio": ["Buon potenziale", "Ottimo in zona gol"],
+        "Note Alessio/Fabrizio": ["Da seguire", "Pronto per il salto"],
+        "Presentato a Miniero": ["X", ""],
+        "Risposta Miniero": ["Interessante", "Da valutare"],
+        "Livello 1": ["X", ""],
+        "Livello 2": ["", "X"],
+        "Livello 1 Prospettiva": ["", "X"],
+        "Link Transfermarkt": ["https://www.transfermarkt.it/mario-rossi/profil/spieler/123456",
+                               "https://www.transfermarkt.it/luca-bianchi/profil/spieler/789012"]
+    })
+
+# Funzione per conversione sicura dei numeri
+def safe_int_convert(value, default=0):
+    try:
+        if pd.isna(value) or value == '' or value is None:
+            return default
+        return int(float(str(value)))
+    except (ValueError, TypeError):
+        return default
+
+# Lettura e scrittura del foglio principale
+
+def read_columns(sheet, headers, columns, first_row=2, last_row=None):
+    """Legge solo le colonne indicate, dalla riga first_row a last_row (inclusa), con un'unica batch_get"""
+    ranges = []
+    for col_name in columns:
+        letter = gspread.utils.rowcol_to_a1(1, headers.index(col_name) + 1)[:-1]
+        ranges.append(f"{letter}{first_row}:{letter}{last_row or ''}")
+
+    results = sheet.batch_get(ranges, major_dimension="COLUMNS") if ranges else []
+    values = [result[0] if result else [] for result in results]
+
+    # Le API tagliano le celle vuote in fondo: riallinea tutte le colonne
+    n_rows = max((len(v) for v in values), default=0)
+    if last_row:
+        n_rows = last_row - first_row + 1
+    if n_rows == 0:
+        # Colonne object, non float64: il primo giocatore aggiunto mantiene i suoi tipi
+        return pd.DataFrame(columns=columns, dtype=object)
+    data = {
+        col_name: gspread.utils.numericise_all((v + [""] * n_rows)[:n_rows])
+        for col_name, v in zip(columns, values)
+    }
+    return pd.DataFrame(data, columns=columns)
+
+def fetch_headers(sheet):
+    """Intestazioni del foglio (riga 1), usate per individuare le colonne"""
+    return sheet.row_values(1)
+
+def init_headers(sheet):
+    """Scrive le intestazioni in un foglio vuoto"""
+    sheet.insert_row(HEADERS, 1)
+
+def fetch_data(sheet, headers):
+    """Scarica i dati strutturati (senza le colonne di note)"""
+    if not headers:
+        return pd.DataFrame()
+
+    compact_columns = [h for h in headers if h and h not in NOTE_COLUMNS]
+    df = read_columns(sheet, headers, compact_columns)
+
+    # Aggiungi colonne se non esistono
+    if len(df) > 0:
+        for col_name, default_value in NEW_COLUMNS.items():
+            if col_name not in df.columns:
+                df[col_name] = default_value
+    return df
+
+def fetch_notes(sheet, headers):
+    """Scarica le colonne di note insieme al nome, usato per verificare l'allineamento"""
+    columns = ["Nome Giocatore"] + [c for c in NOTE_COLUMNS if c in headers]
+    notes = read_columns(sheet, headers, columns)
+    for col_name in NOTE_COLUMNS:
+        if col_name not in notes.columns:
+            notes[col_name] = ""
+    return notes
+
+def fetch_player_notes(sheet, headers, row_index):
+    """Legge le note di un solo giocatore (row_index è la posizione nel DataFrame)"""
+    columns = ["Nome Giocatore"] + [c for c in NOTE_COLUMNS if c in headers]
+    row = row_index + 2  # riga 1 = intestazioni
+    notes = read_columns(sheet, headers, columns, first_row=row, last_row=row).iloc[0].to_dict()
+    for col_name in NOTE_COLUMNS:
+        notes.setdefault(col_name, "")
+    return notes
+
+def merge_notes(df, notes, headers):
+    """Unisce le note a df (anche un sottoinsieme di righe), nell'ordine delle colonne del foglio.
+    Solleva NotesMisalignedError se le righe non corrispondono più."""
+    aligned = df.index.isin(notes.index).all() and (
+        notes.loc[df.index, "Nome Giocatore"].astype(str) == df["Nome Giocatore"].astype(str)
+    ).all()
+    if not aligned:
+        raise NotesMisalignedError("Le note non corrispondono più alle righe dei dati")
+
+    merged = df.join(notes.loc[df.index, NOTE_COLUMNS])
+    order = [c for c in headers if c in merged.columns]
+    order += [c for c in merged.columns if c not in order]
+    return merged[order]
+
+def fetch_full_data(sheet):
+    """Tutte le colonne, note comprese (per export e controlli)"""
+    headers = fetch_headers(sheet)
+    df = fetch_data(sheet, headers)
+    if df.empty:
+        return df
+    return merge_notes(df, fetch_notes(sheet, headers), headers)
+
+def count_rows(sheet):
+    """Giocatori presenti nel foglio (righe della prima colonna, intestazioni escluse)"""
+    return max(len(sheet.col_values(1)) - 1, 0)
+
+def write_data(sheet, df, expected_rows=None):
+    """Riscrive l'intero foglio con il contenuto di df.
+    expected_rows è il numero di righe dei dati da cui df è stato ricavato: se il foglio
+    nel frattempo è cambiato (es. un import da cli.py) solleva SheetChangedError invece
+    di cancellare quelle righe."""
+    if expected_rows is not None and count_rows(sheet) != expected_rows:
+        raise SheetChangedError(f"Il foglio ha {count_rows(sheet)} righe invece di {expected_rows}")
+    sheet.clear()
+    sheet.update([df.columns.values.tolist()] + df.values.tolist())
+
+# Copia locale su disco (Parquet) dell'ultimo stato valido, per l'avvio immediato e il
+# funzionamento offline. Dati compatti e note sono in file separati, come nel foglio
+# vengono letti separatamente. I valori sono salvati come testo e riconvertiti in
+# lettura come fa gspread, perché le colonne del foglio mescolano numeri e celle vuote.
+SNAPSHOT_DIR = Path(__file__).resolve().parent / "snapshots"
+SNAPSHOT_DATA = "giocatori"
+SNAPSHOT_NOTES = "note"
+
+def write_snapshot(df, name, metadata=None, directory=SNAPSHOT_DIR):
+    """Salva df in <directory>/<name>.parquet (scrittura atomica); metadata è un dict JSON"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(df.fillna("").astype(str), preserve_index=False)
+    metadata = dict(metadata or {}, salvato=datetime.now().isoformat(timespec="seconds"))
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"dati_calcio": json.dumps(metadata, ensure_ascii=False).encode()
+    })
+
+    path = directory / f"{name}.parquet"
+    tmp_path = path.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+def read_snapshot(name, directory=SNAPSHOT_DIR):
+    """Legge una copia locale (interamente in memoria); restituisce (df, metadata) o (None, None)"""
+    import pyarrow.parquet as pq
+
+    path = Path(directory) / f"{name}.parquet"
+    if not path.exists():
+        return None, None
+    table = pq.read_table(path)
+    metadata = json.loads((table.schema.metadata or {}).get(b"dati_calcio", b"{}"))
+    df = pd.DataFrame(
+        {col_name: gspread.utils.numericise_all(table.column(col_name).to_pylist()) for col_name in table.column_names},
+        columns=table.column_names
+    )
+    return df, metadata
+
+def write_snapshots(df, headers, metadata=None, directory=SNAPSHOT_DIR):
+    """Salva un DataFrame completo (con note) come copia dei dati compatti e delle note"""
+    metadata = dict(metadata or {}, headers=list(headers))
+    write_snapshot(df.drop(columns=[c for c in NOTE_COLUMNS if c in df.columns]), SNAPSHOT_DATA, metadata, directory)
+    note_columns = ["Nome Giocatore"] + [c for c in NOTE_COLUMNS if c in df.columns]
+    write_snapshot(df[note_columns], SNAPSHOT_NOTES, metadata, directory)
+
+def read_full_snapshot(directory=SNAPSHOT_DIR):
+    """Copia locale completa (dati e note); (None, None) se manca o non è allineata"""
+    df, metadata = read_snapshot(SNAPSHOT_DATA, directory)
+    notes, _ = read_snapshot(SNAPSHOT_NOTES, directory)
+    if df is None or notes is None:
+        return None, None
+    try:
+        return merge_notes(df, notes, metadata.get("headers", [])), metadata
+    except NotesMisalignedError:
+        return None, None
+
+# Log delle modifiche append-only (foglio separato, o lista in memoria in modalità demo).
+# Il numero di sequenza di ogni voce è la sua posizione nel log (riga - 1).
+CHANGELOG_TITLE = "Log Modifiche"
+CHANGELOG_HEADERS = ["Timestamp", "Utente", "Operazione", "Riga", "Nome Giocatore", "Dati"]
+CHANGELOG_OPERATIONS = ["aggiunta", "modifica", "ripristino", "eliminazione", "archiviazione"]
+
+def open_changelog(sheet):
+    """Foglio del log, creato se non esiste ancora"""
+    try:
+        return sheet.spreadsheet.worksheet(CHANGELOG_TITLE)
+    except gspread.exceptions.WorksheetNotFound:
+        log_sheet = sheet.spreadsheet.add_worksheet(CHANGELOG_TITLE, rows=1000, cols=len(CHANGELOG_HEADERS))
+        log_sheet.append_row(CHANGELOG_HEADERS)
+        return log_sheet
+
+def make_log_entry(user, operation, row_index, player):
+    """Voce del log: player è la riga completa dopo la modifica (prima, se eliminata)"""
+    return [
+        datetime.now().isoformat(timespec="seconds"),
+        user,
+        operation,
+        int(row_index),
+        str(player.get("Nome Giocatore", "")),
+        json.dumps({k: v for k, v in player.items()}, ensure_ascii=False, default=str)
+    ]
+
+def append_log_entries(log, entries):
+    if isinstance(log, list):
+        log.extend(entries)
+    elif entries:
+        log.append_rows(entries, value_input_option="RAW")
+
+def read_changes(log, since_seq=0):
+    """Restituisce solo le voci del log successive a since_seq, con la colonna Seq"""
+    if isinstance(log, list):
+        rows = log[since_seq:]
+    else:
+        rows = log.get_values(f"A{since_seq + 2}:F")
+        rows = [(row + [""] * len(CHANGELOG_HEADERS))[:len(CHANGELOG_HEADERS)] for row in rows if any(row)]
+    changes = pd.DataFrame(rows, columns=CHANGELOG_HEADERS)
+    changes.insert(0, "Seq", range(since_seq + 1, since_seq + 1 + len(changes)))
+    changes["Riga"] = pd.to_numeric(changes["Riga"], errors="coerce").fillna(-1).astype(int)
+    return changes
+
+def apply_changes(df, changes):
+    """Riapplica in ordine le voci del log a una copia di df (sincronizzazione incrementale)"""
+    df = df.copy()
+    for change in changes.itertuples(index=False):
+        player = json.loads(change.Dati)
+        if change.Operazione == "aggiunta":
+            df = pd.concat([df, pd.DataFrame([player])], ignore_index=True)
+        elif change.Operazione in ("modifica", "ripristino"):
+            for col_name, value in player.items():
+                df.loc[change.Riga, col_name] = value
+        elif change.Operazione in ("eliminazione", "archiviazione"):
+            df = df.drop(change.Riga).reset_index(drop=True)
+    return df
+
+def player_history(changes, row):
+    """Voci del log del giocatore che oggi è alla riga row (aggiunta, modifiche, ripristini).
+    Il log viene letto all'indietro seguendo gli spostamenti della riga dovuti alle
+    eliminazioni: le voci restano sue anche dopo un cambio di nome e non vengono
+    attribuite a un omonimo."""
+    seqs = []
+    for change in reversed(list(changes.itertuples(index=False))):
+        if change.Operazione in ("eliminazione", "archiviazione"):
+            if change.Riga <= row:
+                row += 1
+        elif change.Riga == row:
+            seqs.append(change.Seq)
+            if change.Operazione == "aggiunta":
+                break
+    return changes[changes["Seq"].isin(seqs)]
+
+# Partizionamento in foglio attivo (sheet1) e fogli di archivio per stagione.
+# Un giocatore non monitorato e non visionato da ARCHIVE_AFTER_DAYS giorni viene spostato
+# nell'archivio della stagione della sua ultima visione.
+ARCHIVE_PREFIX = "Archivio "
+ARCHIVE_AFTER_DAYS = 730
+
+def archive_season(day):
+    """Stagione calcistica (luglio-giugno) di una data, es. 2023-24"""
+    start = day.year if day.month >= 7 else day.year - 1
+    return f"{start}-{str(start + 1)[-2:]}"
+
+def last_seen_dates(df):
+    """Data ultima visione, o di inserimento se manca; NaT se nessuna delle due è valida"""
+    empty = pd.Series("", index=df.index)
+    last_seen = pd.to_datetime(df.get("Data ultima visione", empty), format="%Y-%m-%d", errors="coerce")
+    inserted = pd.to_datetime(df.get("Data inserimento in piattaforma", empty), format="%Y-%m-%d", errors="coerce")
+    return last_seen.fillna(inserted)
+
+def stale_players_mask(df):
+    """Righe del foglio attivo da spostare in archivio"""
+    if df.empty:
+        return pd.Series(False, index=df.index)
+    cutoff = pd.Timestamp(date.today()) - pd.Timedelta(days=ARCHIVE_AFTER_DAYS)
+    monitored = df.get("Da Monitorare", pd.Series("", index=df.index)) == "X"
+    return (last_seen_dates(df) < cutoff) & ~monitored
+
+# Colonne che identificano un giocatore già presente in un archivio
+ARCHIVE_KEY_COLUMNS = ["Nome Giocatore", "Squadra", "Data inserimento in piattaforma"]
+
+def write_archive(sheet, players):
+    """Aggiunge i giocatori (con note) agli archivi della stagione della loro ultima visione.
+    Chi è già nell'archivio (stessi ARCHIVE_KEY_COLUMNS) viene saltato: un'archiviazione
+    interrotta si può ripetere senza duplicare righe."""
+    seasons = last_seen_dates(players).apply(archive_season)
+    for season, rows in players.groupby(seasons):
+        title = ARCHIVE_PREFIX + season
+        try:
+            archive = sheet.spreadsheet.worksheet(title)
+            existing = archive.get_values()
+        except gspread.exceptions.WorksheetNotFound:
+            archive = sheet.spreadsheet.add_worksheet(title, rows=len(rows) + 1, cols=len(players.columns))
+            existing = []
+        if not existing:
+            existing = [players.columns.tolist()]
+            archive.append_row(existing[0])
+
+        archive_headers = existing[0]
+        key_positions = [archive_headers.index(c) for c in ARCHIVE_KEY_COLUMNS if c in archive_headers]
+        archived = {tuple((row + [""] * len(archive_headers))[i] for i in key_positions) for row in existing[1:]}
+
+        rows = rows.reindex(columns=archive_headers, fill_value="").fillna("").values.tolist()
+        new_rows = [row for row in rows if not key_positions or tuple(str(row[i]) for i in key_positions) not in archived]
+        if new_rows:
+            archive.append_rows(new_rows, value_input_option="RAW")
+
+def read_archive(sheet):
+    """Tutti i fogli di archivio, con la colonna Archivio che indica la stagione"""
+    shards = []
+    for worksheet in sheet.spreadsheet.worksheets():
+        if worksheet.title.startswith(ARCHIVE_PREFIX):
+            shard = pd.DataFrame(worksheet.get_all_records())
+            shard.insert(0, "Archivio", worksheet.title[len(ARCHIVE_PREFIX):])
+            shards.append(shard)
+    return pd.concat(shards, ignore_index=True) if shards else pd.DataFrame()
+
+# Rilevamento duplicati con indice a blocchi.
+# Ogni giocatore è indicizzato per (token del nome, fascia d'età) e (squadra, fascia d'età):
+# il confronto fuzzy avviene solo con i candidati dello stesso blocco, non con tutto il foglio.
+# Le stesse chiavi con fascia None ignorano l'età, per cercare chi non la indica (es. import).
+AGE_BUCKET_YEARS = 3
+DUPLICATE_THRESHOLD = 0.75
+
+def normalize_name(name):
+    """Minuscolo, senza accenti né punteggiatura (es. "José Martínez-Ruiz" -> "jose martinez ruiz")"""
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode().lower()
+    return " ".join("".join(c if c.isalnum() else " " for c in text).split())
+
+def blocking_keys(name, squad, age):
+    """Chiavi di blocco di un giocatore; l'età sconosciuta finisce nella fascia -1"""
+    age_value = safe_int_convert(age, -1)
+    bucket = age_value // AGE_BUCKET_YEARS if age_value >= 0 else -1
+    keys = {("nome", token, bucket) for token in normalize_name(name).split() if len(token) >= 3}
+    squad_key = normalize_name(squad)
+    if squad_key:
+        keys.add(("squadra", squad_key, bucket))
+    return keys
+
+def add_to_duplicate_index(index, row, name, squad, age):
+    for kind, value, bucket in blocking_keys(name, squad, age):
+        index[(kind, value, bucket)].append(row)
+        index[(kind, value, None)].append(row)
+
+def build_duplicate_index(df):
+    """Indice chiave di blocco -> posizioni delle righe"""
+    index = defaultdict(list)
+    if df.empty:
+        return index
+    for row, (name, squad, age) in enumerate(zip(df["Nome Giocatore"], df["Squadra"], df.get("Età", [""] * len(df)))):
+        add_to_duplicate_index(index, row, name, squad, age)
+    return index
+
+def find_duplicates(df, index, name, squad, age):
+    """Possibili duplicati di un nuovo giocatore come lista di (riga, punteggio), dal più simile"""
+    age_value = safe_int_convert(age, -1)
+    candidates = set()
+    for kind, value, bucket in blocking_keys(name, squad, age):
+        # Fasce adiacenti, per non perdere giocatori a cavallo del confine, e quelli senza
+        # età; se l'età del nuovo giocatore è sconosciuta vale qualsiasi fascia
+        near_buckets = (None,) if bucket == -1 else (bucket - 1, bucket, bucket + 1, -1)
+        for near in near_buckets:
+            candidates.update(index.get((kind, value, near), []))
+
+    target_name = normalize_name(name)
+    target_squad = normalize_name(squad)
+    matches = []
+    for row in candidates:
+        if row >= len(df):
+            continue  # indice esteso nel frattempo con righe aggiunte dopo df
+        player = df.iloc[row]
+        score = 0.7 * SequenceMatcher(None, target_name, normalize_name(player["Nome Giocatore"])).ratio()
+        player_squad = normalize_name(player["Squadra"])
+        if target_squad and player_squad and (target_squad in player_squad or player_squad in target_squad):
+            score += 0.2
+        player_age = safe_int_convert(player.get("Età"), -1)
+        if age_value >= 0 and player_age >= 0 and abs(player_age - age_value) <= 1:
+            score += 0.1
+        if score >= DUPLICATE_THRESHOLD:
+            matches.append((row, round(score, 2)))
+    return sorted(matches, key=lambda match: match[1], reverse=True)
+
+# Shortlist: filtri salvati con un nome, condivisi tramite un foglio dedicato.
+# "Ultimo risultato" conserva i giocatori di un momento preciso, per il confronto nel tempo.
+SHORTLIST_TITLE = "Shortlist"
+SHORTLIST_HEADERS = ["Nome", "Filtri", "Creata da", "Aggiornata", "Ultimo risultato"]
+
+def filter_mask(df, filters):
+    """Righe che soddisfano i filtri: nome (testo contenuto), squadre, ruoli e valutazioni ("X")"""
+    mask = pd.Series(True, index=df.index)
+    if filters.get("nome"):
+        mask &= df["Nome Giocatore"].astype(str).str.contains(filters["nome"], case=False, regex=False, na=False)
+    if filters.get("squadre"):
+        mask &= df["Squadra"].isin(filters["squadre"])
+    if filters.get("ruoli"):
+        mask &= df["Ruolo"].isin(filters["ruoli"])
+    for col_name in filters.get("valutazioni", []):
+        mask &= df.get(col_name, pd.Series("", index=df.index)) == "X"
+    return mask
+
+def update_materialized(rows, df, filters, deltas):
+    """Aggiorna le posizioni dei giocatori di una shortlist rivalutando solo le righe toccate
+    dalle variazioni (nell'ordine in cui sono avvenute), invece di rifiltrare tutto df"""
+    rows, dirty = set(rows), set()
+    for delta in deltas:
+        row = delta["riga"]
+        if delta["operazione"] in ("eliminazione", "archiviazione"):
+            rows = {r - (r > row) for r in rows if r != row}
+            dirty = {r - (r > row) for r in dirty if r != row}
+        else:
+            dirty.add(row)
+
+    dirty = sorted(r for r in dirty if r < len(df))
+    if dirty:
+        matching = filter_mask(df.iloc[dirty], filters).to_numpy()
+        rows -= set(dirty)
+        rows |= {r for r, match in zip(dirty, matching) if match}
+    return rows
+
+def open_shortlists(sheet):
+    """Foglio delle shortlist, creato se non esiste ancora"""
+    try:
+        return sheet.spreadsheet.worksheet(SHORTLIST_TITLE)
+    except gspread.exceptions.WorksheetNotFound:
+        shortlist_sheet = sheet.spreadsheet.add_worksheet(SHORTLIST_TITLE, rows=100, cols=len(SHORTLIST_HEADERS))
+        shortlist_sheet.append_row(SHORTLIST_HEADERS)
+        return shortlist_sheet
+
+def read_shortlists(shortlist_sheet):
+    """Shortlist come lista di dict, con Filtri e Ultimo risultato già decodificati.
+    Le celle sono lette come testo: un nome come "2024" deve restare una stringa."""
+    if isinstance(shortlist_sheet, list):
+        records = shortlist_sheet
+    else:
+        rows = shortlist_sheet.get_values()
+        records = [dict(zip(rows[0], row + [""] * len(rows[0]))) for row in rows[1:]] if rows else []
+    shortlists = []
+    for record in records:
+        shortlist = dict(record)
+        shortlist["Filtri"] = json.loads(record["Filtri"] or "{}")
+        shortlist["Ultimo risultato"] = json.loads(record["Ultimo risultato"] or "null")
+        shortlists.append(shortlist)
+    return shortlists
+
+def save_shortlist(shortlist_sheet, shortlist):
+    """Crea o sostituisce (per nome) una shortlist"""
+    record = dict(
+        shortlist,
+        Filtri=json.dumps(shortlist["Filtri"], ensure_ascii=False),
+        **{"Ultimo risultato": json.dumps(shortlist.get("Ultimo risultato"), ensure_ascii=False)}
+    )
+    record["Nome"] = str(record["Nome"])
+    values = [record.get(col_name, "") for col_name in SHORTLIST_HEADERS]
+
+    if isinstance(shortlist_sheet, list):
+        names = [str(r["Nome"]) for r in shortlist_sheet]
+        if record["Nome"] in names:
+            shortlist_sheet[names.index(record["Nome"])] = dict(zip(SHORTLIST_HEADERS, values))
+        else:
+            shortlist_sheet.append(dict(zip(SHORTLIST_HEADERS, values)))
+        return
+
+    names = shortlist_sheet.col_values(1)
+    if record["Nome"] in names:
+        row = names.index(record["Nome"]) + 1
+        shortlist_sheet.update(range_name=f"A{row}", values=[values], value_input_option="RAW")
+    else:
+        shortlist_sheet.append_row(values, value_input_option="RAW")
+
+def delete_shortlist(shortlist_sheet, name):
+    name = str(name)
+    if isinstance(shortlist_sheet, list):
+        shortlist_sheet[:] = [r for r in shortlist_sheet if str(r["Nome"]) != name]
+        return
+    names = shortlist_sheet.col_values(1)
+    if name in names:
+        shortlist_sheet.delete_rows(names.index(name) + 1)
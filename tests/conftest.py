@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# dati.py è nella radice del repository, accanto all'app
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
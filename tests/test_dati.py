@@ -0,0 +1,21 @@
+import dati
+
+
+def test_find_duplicates_without_age():
+    df = dati.sample_data()
+    index = dati.build_duplicate_index(df)
+    assert [row for row, _ in dati.find_duplicates(df, index, "Mario Rossi", "Juventus", "")] == [0]
+
+
+def test_find_duplicates_against_player_without_age():
+    df = dati.sample_data()
+    df["Età"] = df["Età"].astype(object)
+    df.loc[1, "Età"] = ""
+    index = dati.build_duplicate_index(df)
+    assert [row for row, _ in dati.find_duplicates(df, index, "Luca Bianchi", "Milan", 28)] == [1]
+
+
+def test_find_duplicates_ignores_distant_ages():
+    df = dati.sample_data()
+    index = dati.build_duplicate_index(df)
+    assert dati.find_duplicates(df, index, "Mario Rossi", "Inter", 40) == []